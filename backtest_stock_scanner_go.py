@@ -1,9 +1,23 @@
 import pandas as pd
 import numpy as np
+import csv
 import os
 import glob
 from multiprocessing import Pool, cpu_count
 
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+    # 没装 numba 时退化为纯 Python 执行，逻辑完全一致
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        def wrap(func):
+            return func
+        return wrap
+
 # ==================== 2025“防假突破”实战参数 ===================
 MIN_PRICE = 5.0              
 MAX_AVG_TURNOVER_30 = 2.0    
@@ -27,121 +41,594 @@ MAX_TODAY_CHANGE = 4.0
 STOP_LOSS = -5.0             # 强制止损线
 TRAILING_START = 8.0         # 盈利8%开启移动止盈保护
 LIFE_LINE_DAY = 3            # 3日生命线：第3天利润不足1%则离场
+HOLD_PERIODS = [3, 5, 10, 20]
+HOLD_PERIODS_ARR = np.array(HOLD_PERIODS, dtype=np.int64)
 # =============================================================
 
+# 参数组：同一次运行可回测多组阈值，CSV 解析与指标计算只做一遍
+BASE_PARAMS = {
+    'RSI6_MAX': RSI6_MAX,
+    'KDJ_K_MAX': KDJ_K_MAX,
+    'MIN_BIAS_20': MIN_BIAS_20,
+    'MAX_BIAS_20': MAX_BIAS_20,
+    'MIN_VOLUME_RATIO': MIN_VOLUME_RATIO,
+    'MAX_VOLUME_RATIO': MAX_VOLUME_RATIO,
+    'MAX_AVG_TURNOVER_30': MAX_AVG_TURNOVER_30,
+    'MIN_PROFIT_POTENTIAL': MIN_PROFIT_POTENTIAL,
+    'MAX_TODAY_CHANGE': MAX_TODAY_CHANGE,
+}
+PARAM_SETS = {'默认': BASE_PARAMS}
+
+# 整文件预筛的乖离上限要对所有参数组都成立，取各组里最宽松的那个；
+# 用模块常量会在某组放宽阈值时把文件提前筛掉，信号无声丢失
+PREFILTER_MAX_BIAS = max(p['MAX_BIAS_20'] for p in PARAM_SETS.values())
+
+CACHE_DIR = 'cache'
+USE_COLS = ['日期', '收盘', '最高', '最低', '成交量', '换手率']
+# 指标缓存版本号：calculate_indicators 的算法一变就 +1，旧缓存自动失效
+IND_VER = 1
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+try:
+    import bottleneck as bn
+    HAS_BN = True
+except ImportError:
+    HAS_BN = False
+
+try:
+    import numexpr as ne
+    HAS_NE = True
+except ImportError:
+    HAS_NE = False
+
+FLOAT32_COLS = ['收盘', '最高', '最低', '成交量', '换手率']
+
+def _downcast(df):
+    # 价格/量能 6 位有效数字足够，float32 省一半内存带宽
+    for c in FLOAT32_COLS:
+        if c in df.columns:
+            df[c] = df[c].astype(np.float32)
+    return df
+
+def _read_csv_arrow(f):
+    """pyarrow 多线程 CSV 解析：显式 schema 免去类型推断，直接产出 float32 列。"""
+    convert = pa_csv.ConvertOptions(
+        column_types={'日期': pa.string(), '收盘': pa.float32(), '最高': pa.float32(),
+                      '最低': pa.float32(), '成交量': pa.float32(), '换手率': pa.float32()},
+        include_columns=USE_COLS)
+    return pa_csv.read_csv(f, convert_options=convert).to_pandas()
+
+def load_bars(f):
+    """读取单只个股K线；装了 pyarrow 时用 parquet 缓存绕开重复的 CSV 解析。"""
+    if not HAS_PARQUET:
+        return _downcast(pd.read_csv(f))
+
+    cache_path = os.path.join(CACHE_DIR, os.path.basename(f).replace('.csv', '.parquet'))
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(f):
+        return pd.read_parquet(cache_path, columns=USE_COLS)
+
+    df = _read_csv_arrow(f)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    df.to_parquet(cache_path, index=False)
+    return df
+
+def _gt_prev(arr):
+    """逐位“比昨天大”判断，等价 s > s.shift(1)，不走 pandas 不产生临时 Series。"""
+    out = np.zeros(arr.shape, dtype=bool)
+    np.greater(arr[1:], arr[:-1], out=out[1:])
+    return out
+
+@njit(cache=True)
+def _indicator_kernel(close, vol):
+    """单次流式遍历算完 RSI6 / KDJ_K / MA5 / MA20 / MA60 / 量5均，
+
+    滚动窗口用“加新减旧”的 O(1) 递推，省掉 pandas 七次全列扫描。"""
+    n = len(close)
+    rsi6 = np.full(n, np.nan)
+    kdj_k = np.full(n, np.nan)
+    ma5 = np.full(n, np.nan)
+    ma20 = np.full(n, np.nan)
+    ma60 = np.full(n, np.nan)
+    vol_ma5 = np.full(n, np.nan)
+
+    s5 = 0.0; s20 = 0.0; s60 = 0.0; sv5 = 0.0
+    gain_sum = 0.0; loss_sum = 0.0
+    # ewm(com=2) 即 alpha=1/3，adjust=True 需要同时递推分子/分母
+    alpha = 1.0 / 3.0
+    num = 0.0; den = 0.0
+
+    # 9日窗口极值用单调队列维护：每个元素进出各一次，摊还 O(1)
+    dq_min = np.empty(n, np.int64); mn_head = 0; mn_tail = 0
+    dq_max = np.empty(n, np.int64); mx_head = 0; mx_tail = 0
+
+    for i in range(n):
+        c = close[i]
+
+        s5 += c
+        if i >= 5: s5 -= close[i - 5]
+        if i >= 4: ma5[i] = s5 / 5.0
+        s20 += c
+        if i >= 20: s20 -= close[i - 20]
+        if i >= 19: ma20[i] = s20 / 20.0
+        s60 += c
+        if i >= 60: s60 -= close[i - 60]
+        if i >= 59: ma60[i] = s60 / 60.0
+
+        if i >= 1:
+            sv5 += vol[i - 1]
+            if i >= 6: sv5 -= vol[i - 6]
+            if i >= 5: vol_ma5[i] = sv5 / 5.0
+
+            d = c - close[i - 1]
+            if d > 0: gain_sum += d
+            elif d < 0: loss_sum -= d
+        if i >= 7:
+            d_old = close[i - 6] - close[i - 7]
+            if d_old > 0: gain_sum -= d_old
+            elif d_old < 0: loss_sum += d_old
+        if i >= 5 and loss_sum != 0.0:
+            rsi6[i] = 100.0 - 100.0 / (1.0 + gain_sum / loss_sum)
+
+        # KDJ：9日收盘最低/最高
+        while mn_tail > mn_head and close[dq_min[mn_tail - 1]] >= c:
+            mn_tail -= 1
+        dq_min[mn_tail] = i; mn_tail += 1
+        while dq_min[mn_head] <= i - 9:
+            mn_head += 1
+        while mx_tail > mx_head and close[dq_max[mx_tail - 1]] <= c:
+            mx_tail -= 1
+        dq_max[mx_tail] = i; mx_tail += 1
+        while dq_max[mx_head] <= i - 9:
+            mx_head += 1
+
+        rsv = np.nan
+        if i >= 8:
+            lo = close[dq_min[mn_head]]
+            hi = close[dq_max[mx_head]]
+            if hi != lo:
+                rsv = (c - lo) / (hi - lo) * 100.0
+        if not np.isnan(rsv):
+            num = (1.0 - alpha) * num + rsv
+            den = (1.0 - alpha) * den + 1.0
+        else:
+            num = (1.0 - alpha) * num
+            den = (1.0 - alpha) * den
+        if den > 0.0:
+            kdj_k[i] = num / den
+
+    return rsi6, kdj_k, ma5, ma20, ma60, vol_ma5
+
 def calculate_indicators(df):
     df = df.reset_index(drop=True)
     close = df['收盘']
     vol = df['成交量']
-    
-    # 基础指标
-    delta = close.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(6).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(6).mean()
-    df['rsi6'] = 100 - (100 / (1 + (gain / loss.replace(0, np.nan))))
-    
-    low_9 = close.rolling(9).min()
-    high_9 = close.rolling(9).max()
-    df['kdj_k'] = ((close - low_9) / (high_9 - low_9) * 100).ewm(com=2).mean()
-    
-    df['ma5'] = close.rolling(5).mean()
-    df['ma20'] = close.rolling(20).mean()
-    df['ma60'] = close.rolling(60).mean()
+
+    if HAS_NUMBA:
+        rsi6, kdj_k, ma5, ma20, ma60, vol_ma5 = _indicator_kernel(
+            close.to_numpy(), vol.to_numpy())
+        df['rsi6'] = rsi6
+        df['kdj_k'] = kdj_k
+        df['ma5'] = ma5
+        df['ma20'] = ma20
+        df['ma60'] = ma60
+        df['vol_ma5'] = vol_ma5
+    elif HAS_BN:
+        # 没有 numba 但有 bottleneck：滚动均值/极值走 C 实现的 move_* 核
+        c = close.to_numpy()
+        v = vol.to_numpy()
+        n = len(c)
+
+        delta = np.full(n, np.nan)
+        delta[1:] = c[1:] - c[:-1]
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = np.where(delta < 0, -delta, 0.0)
+        gain_m = bn.move_mean(gain, 6, min_count=6)
+        loss_m = bn.move_mean(loss, 6, min_count=6)
+        loss_m = np.where(loss_m == 0, np.nan, loss_m)
+        df['rsi6'] = 100 - (100 / (1 + gain_m / loss_m))
+
+        low_9 = bn.move_min(c, 9, min_count=9)
+        high_9 = bn.move_max(c, 9, min_count=9)
+        span = np.where(high_9 == low_9, np.nan, high_9 - low_9)
+        rsv = (c - low_9) / span * 100
+        df['kdj_k'] = pd.Series(rsv).ewm(com=2).mean().to_numpy()
+
+        df['ma5'] = bn.move_mean(c, 5, min_count=5)
+        df['ma20'] = bn.move_mean(c, 20, min_count=20)
+        df['ma60'] = bn.move_mean(c, 60, min_count=60)
+        vol_ma5 = np.full(n, np.nan)
+        vol_ma5[1:] = bn.move_mean(v, 5, min_count=5)[:-1]
+        df['vol_ma5'] = vol_ma5
+    else:
+        # 基础指标（pandas 兜底路径）
+        delta = close.diff()
+        gain = (delta.where(delta > 0, 0)).rolling(6).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(6).mean()
+        df['rsi6'] = 100 - (100 / (1 + (gain / loss.replace(0, np.nan))))
+
+        low_9 = close.rolling(9).min()
+        high_9 = close.rolling(9).max()
+        df['kdj_k'] = ((close - low_9) / (high_9 - low_9) * 100).ewm(com=2).mean()
+
+        df['ma5'] = close.rolling(5).mean()
+        df['ma20'] = close.rolling(20).mean()
+        df['ma60'] = close.rolling(60).mean()
+        df['vol_ma5'] = vol.shift(1).rolling(5).mean()
+
     df['bias20'] = (close - df['ma20']) / df['ma20'] * 100
-    
+
+    # 站稳线：5日线上浮 0.5%，提前乘好省掉筛选时的逐列乘法
+    df['stand_line'] = df['ma5'] * STAND_STILL_THRESHOLD
+
     # 核心判断逻辑：5日线斜率趋缓
-    ma5_diff = df['ma5'].diff()
-    df['slope_slowing'] = ma5_diff > ma5_diff.shift(1)
-    
+    ma5_arr = df['ma5'].to_numpy()
+    ma5_diff = np.full(len(ma5_arr), np.nan)
+    ma5_diff[1:] = ma5_arr[1:] - ma5_arr[:-1]
+    df['slope_slowing'] = _gt_prev(ma5_diff)
+
+    # 当日涨跌幅（老版本在扫描循环里逐行取前收计算）
+    c_arr = close.to_numpy()
+    change_pct = np.full(len(c_arr), np.nan)
+    change_pct[1:] = (c_arr[1:] / c_arr[:-1] - 1) * 100
+    df['change_pct'] = change_pct
+
     # 量能
-    df['vol_ma5'] = vol.shift(1).rolling(5).mean()
     df['vol_ratio'] = vol / df['vol_ma5']
-    df['vol_increase'] = vol > vol.shift(1) 
-    
+    df['vol_increase'] = _gt_prev(vol.to_numpy())
+
+    # 30日平均换手率（曾经在扫描循环里按行重算，挪到这里只算一次）
+    if HAS_BN:
+        df['avg_turnover_30'] = bn.move_mean(df['换手率'].to_numpy(), 30, min_count=30)
+    else:
+        df['avg_turnover_30'] = df['换手率'].rolling(30).mean()
+
     return df
 
-def simulate_trade(df, start_idx, max_days):
-    buy_price = df.iloc[start_idx]['收盘']
+@njit(cache=True, fastmath=True)
+def simulate_trade_multi(close, high, low, start_idx, periods):
+    """一次走到最长持有期，在各周期边界记下收益。
+
+    止损/生命线/移动止盈一旦触发，剩余所有周期都按离场收益结算，
+    等价于对每个周期单独模拟，但 20 日的路径只走一遍。"""
+    n = len(close)
+    k = len(periods)
+    out = np.empty(k)
+    buy_price = close[start_idx]
     max_p = buy_price
-    
-    for d in range(1, max_days + 1):
-        if start_idx + d >= len(df): break
-        row = df.iloc[start_idx + d]
-        max_p = max(max_p, row['最高'])
-        
-        current_profit = (row['收盘'] - buy_price) / buy_price * 100
-        
+    pi = 0
+
+    for d in range(1, periods[k - 1] + 1):
+        if start_idx + d >= n:
+            # 数据走完：尚未离场的周期按最后一根收盘结算
+            last_ret = (close[n - 1] - buy_price) / buy_price * 100
+            for j in range(pi, k):
+                out[j] = last_ret
+            return out
+        i = start_idx + d
+        if high[i] > max_p:
+            max_p = high[i]
+
+        current_profit = (close[i] - buy_price) / buy_price * 100
+        exited = False
+        exit_ret = 0.0
+
         # 1. 触发止损
-        if (row['最低'] - buy_price) / buy_price * 100 <= STOP_LOSS:
-            return STOP_LOSS
-            
+        if (low[i] - buy_price) / buy_price * 100 <= STOP_LOSS:
+            exit_ret = STOP_LOSS
+            exited = True
         # 2. 核心保护：3日生命线
-        if d == LIFE_LINE_DAY and current_profit < 1.0:
-            return current_profit
-
-        # 3. 移动止盈 (回撤25%离场)
-        profit_peak = (max_p - buy_price) / buy_price * 100
-        if profit_peak >= TRAILING_START:
-            drawback = (max_p - row['收盘']) / (max_p - buy_price)
-            if drawback >= 0.25:
-                return max(current_profit, 1.5) # 确保至少保留一部分利润
-                
-    return (df.iloc[min(start_idx + max_days, len(df)-1)]['收盘'] - buy_price) / buy_price * 100
+        elif d == LIFE_LINE_DAY and current_profit < 1.0:
+            exit_ret = current_profit
+            exited = True
+        else:
+            # 3. 移动止盈 (回撤25%离场)
+            profit_peak = (max_p - buy_price) / buy_price * 100
+            if profit_peak >= TRAILING_START:
+                drawback = (max_p - close[i]) / (max_p - buy_price)
+                if drawback >= 0.25:
+                    exit_ret = max(current_profit, 1.5) # 确保至少保留一部分利润
+                    exited = True
+
+        if exited:
+            for j in range(pi, k):
+                out[j] = exit_ret
+            return out
+
+        while pi < k and periods[pi] == d:
+            out[pi] = current_profit
+            pi += 1
+
+    return out
+
+def _simulate_trade_multi_np(close, high, low, start_idx, periods):
+    """simulate_trade_multi 的向量化等价实现：
+
+    三类离场条件先整窗算成布尔数组，再用 argmax 找首次触发日，
+    没有逐日 Python 循环。没装 numba 时以此替代 JIT 内核。"""
+    n = len(close)
+    k = len(periods)
+    buy_price = close[start_idx]
+    w = min(int(periods[-1]), n - 1 - start_idx)
+    if w <= 0:
+        last_ret = (close[n - 1] - buy_price) / buy_price * 100
+        return np.full(k, last_ret)
+
+    close_win = close[start_idx + 1:start_idx + w + 1]
+    high_win = high[start_idx + 1:start_idx + w + 1]
+    low_win = low[start_idx + 1:start_idx + w + 1]
+
+    ret = (close_win - buy_price) / buy_price * 100
+    sl_hit = (low_win - buy_price) / buy_price * 100 <= STOP_LOSS
+
+    max_p = np.maximum(np.maximum.accumulate(high_win), buy_price)
+    peak = (max_p - buy_price) / buy_price * 100
+    with np.errstate(invalid='ignore', divide='ignore'):
+        drawback = (max_p - close_win) / (max_p - buy_price)
+    tr_hit = (peak >= TRAILING_START) & (drawback >= 0.25)
+
+    ll_hit = np.zeros(w, dtype=bool)
+    if w >= LIFE_LINE_DAY:
+        ll_hit[LIFE_LINE_DAY - 1] = ret[LIFE_LINE_DAY - 1] < 1.0
+
+    exit_mask = sl_hit | ll_hit | tr_hit
+    exit_day = 0
+    exit_ret = 0.0
+    has_exit = exit_mask.any()
+    if has_exit:
+        e = int(np.argmax(exit_mask))
+        exit_day = e + 1
+        # 同一日内优先级与逐日版一致：止损 > 生命线 > 移动止盈
+        if sl_hit[e]:
+            exit_ret = STOP_LOSS
+        elif ll_hit[e]:
+            exit_ret = ret[e]
+        else:
+            exit_ret = max(ret[e], 1.5)
+
+    out = np.empty(k)
+    for j in range(k):
+        p = int(periods[j])
+        if has_exit and p >= exit_day:
+            out[j] = exit_ret
+        else:
+            out[j] = ret[min(p, w) - 1]
+    return out
+
+if not HAS_NUMBA:
+    # 无 JIT 时，逐日 Python 循环比向量化版慢一个量级
+    simulate_trade_multi = _simulate_trade_multi_np
+
+@njit(cache=True, fastmath=True)
+def _simulate_trades_batch_nb(close, high, low, idxs, periods):
+    out = np.empty((len(idxs), len(periods)))
+    for j in range(len(idxs)):
+        out[j] = simulate_trade_multi(close, high, low, idxs[j], periods)
+    return out
+
+def simulate_trades(close, high, low, idxs, periods):
+    """整批信号一次模拟，返回 (信号数, 周期数) 的收益矩阵。"""
+    if HAS_NUMBA:
+        return _simulate_trades_batch_nb(close, high, low, idxs, periods)
+    out = np.empty((len(idxs), len(periods)))
+    for j, i in enumerate(idxs):
+        out[j] = _simulate_trade_multi_np(close, high, low, i, periods)
+    return out
+
+@njit(cache=True)
+def _scan_signals_nb(rsi6, kdj_k, bias20, close_arr, stand_line,
+                     slope_slowing, vol_increase, vol_ratio,
+                     avg_turnover_30, potential, change,
+                     rsi6_max, kdj_k_max, min_bias, max_bias,
+                     min_vr, max_vr, max_turn, min_pot, max_chg):
+    """全部阈值比较融合成一趟扫描；先数个数再填充，避免动态 append。
+
+    NaN 与任何阈值比较都是 False，和 pandas 逐行判断的语义一致。"""
+    n = len(rsi6)
+    hit = np.zeros(n, dtype=np.bool_)
+    cnt = 0
+    for i in range(n):
+        if (rsi6[i] <= rsi6_max and kdj_k[i] <= kdj_k_max and
+                bias20[i] >= min_bias and bias20[i] <= max_bias and
+                close_arr[i] >= stand_line[i] and
+                slope_slowing[i] and vol_increase[i] and
+                vol_ratio[i] >= min_vr and vol_ratio[i] <= max_vr and
+                avg_turnover_30[i] <= max_turn and
+                potential[i] >= min_pot and change[i] <= max_chg):
+            hit[i] = True
+            cnt += 1
+    out = np.empty(cnt, dtype=np.int64)
+    j = 0
+    for i in range(n):
+        if hit[i]:
+            out[j] = i
+            j += 1
+    return out
+
+def scan_signals(cols, params):
+    """在抽好的指标数组上按一组阈值选出信号下标。"""
+    if HAS_NUMBA:
+        idxs = _scan_signals_nb(
+            cols['rsi6'], cols['kdj_k'], cols['bias20'],
+            cols['close_arr'], cols['stand_line'],
+            cols['slope_slowing'], cols['vol_increase'],
+            cols['vol_ratio'], cols['avg_turnover_30'],
+            cols['potential'], cols['change'],
+            params['RSI6_MAX'], params['KDJ_K_MAX'],
+            params['MIN_BIAS_20'], params['MAX_BIAS_20'],
+            params['MIN_VOLUME_RATIO'], params['MAX_VOLUME_RATIO'],
+            params['MAX_AVG_TURNOVER_30'], params['MIN_PROFIT_POTENTIAL'],
+            params['MAX_TODAY_CHANGE'])
+    elif HAS_NE:
+        # numexpr 把十来个比较融合成一次扫描，不落中间 bool 数组
+        mask = ne.evaluate(
+            '(rsi6 <= RSI6_MAX) & (kdj_k <= KDJ_K_MAX) &'
+            '(bias20 >= MIN_BIAS_20) & (bias20 <= MAX_BIAS_20) &'
+            '(close_arr >= stand_line) & slope_slowing & vol_increase &'
+            '(vol_ratio >= MIN_VOLUME_RATIO) & (vol_ratio <= MAX_VOLUME_RATIO) &'
+            '(avg_turnover_30 <= MAX_AVG_TURNOVER_30) &'
+            '(potential >= MIN_PROFIT_POTENTIAL) & (change <= MAX_TODAY_CHANGE)',
+            local_dict={**cols, **params})
+        idxs = np.flatnonzero(mask)
+    else:
+        # 由挑剔到宽松分级收窄：绝大多数K线过不了超跌双指标，
+        # 后续各列只在幸存的候选位上按下标读取
+        cand = np.flatnonzero((cols['rsi6'] <= params['RSI6_MAX']) &
+                              (cols['kdj_k'] <= params['KDJ_K_MAX']))
+        if cand.size:
+            b20 = cols['bias20'][cand]
+            cand = cand[(b20 >= params['MIN_BIAS_20']) & (b20 <= params['MAX_BIAS_20'])]
+        if cand.size:
+            cand = cand[cols['close_arr'][cand] >= cols['stand_line'][cand]]
+        if cand.size:
+            cand = cand[cols['slope_slowing'][cand] & cols['vol_increase'][cand]]
+        if cand.size:
+            vr = cols['vol_ratio'][cand]
+            cand = cand[(vr >= params['MIN_VOLUME_RATIO']) & (vr <= params['MAX_VOLUME_RATIO'])]
+        if cand.size:
+            cand = cand[cols['avg_turnover_30'][cand] <= params['MAX_AVG_TURNOVER_30']]
+        if cand.size:
+            cand = cand[cols['potential'][cand] >= params['MIN_PROFIT_POTENTIAL']]
+        if cand.size:
+            cand = cand[cols['change'][cand] <= params['MAX_TODAY_CHANGE']]
+        idxs = cand
+
+    return idxs[(idxs >= 60) & (idxs < len(cols['close_arr']) - 30)]
+
+def _can_ever_signal(close):
+    """整文件级预筛：20日乖离从未跌进任一参数组阈值区的票不可能出信号。
+
+    用 cumsum 一趟算出近似 bias20 的全程最小值，约 1ms，
+    能直接跳过整套指标计算。上限取所有参数组中最宽松的，
+    保证对每一组都是必要条件。"""
+    csum = np.cumsum(close, dtype=np.float64)
+    ma20 = (csum[19:] - np.concatenate(([0.0], csum[:-20]))) / 20.0
+    approx_bias = (close[19:] - ma20) / ma20 * 100
+    return approx_bias.min() <= PREFILTER_MAX_BIAS
+
+def load_indicators(f):
+    """读取算好指标的K线表；调参时指标不随阈值变，直接命中 sidecar 缓存。"""
+    ind_path = os.path.join(
+        CACHE_DIR, os.path.basename(f).replace('.csv', f'.ind{IND_VER}.parquet'))
+    if HAS_PARQUET and os.path.exists(ind_path) \
+            and os.path.getmtime(ind_path) >= os.path.getmtime(f):
+        return pd.read_parquet(ind_path)
+
+    df = load_bars(f)
+    if len(df) < 100: return None
+    if not _can_ever_signal(df['收盘'].to_numpy()):
+        return None
+    df = calculate_indicators(df)
+    if HAS_PARQUET:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        df.to_parquet(ind_path, index=False)
+    return df
 
 def process_file(f):
     try:
-        df = pd.read_csv(f)
-        if len(df) < 100: return []
-        df = calculate_indicators(df)
+        df = load_indicators(f)
+        if df is None or len(df) < 100: return []
+
+        # 每列只抽取一次 numpy 数组，之后筛选和模拟全在数组上做，
+        # 小文件上 pandas 每次调用的固定开销就此消失
+        close_arr = df['收盘'].to_numpy()
+        high_arr = df['最高'].to_numpy()
+        low_arr = df['最低'].to_numpy()
+        rsi6 = df['rsi6'].to_numpy()
+        kdj_k = df['kdj_k'].to_numpy()
+        bias20 = df['bias20'].to_numpy()
+        stand_line = df['stand_line'].to_numpy()
+        ma60 = df['ma60'].to_numpy()
+        vol_ratio = df['vol_ratio'].to_numpy()
+        slope_slowing = df['slope_slowing'].to_numpy()
+        vol_increase = df['vol_increase'].to_numpy()
+        avg_turnover_30 = df['avg_turnover_30'].to_numpy()
+
+        potential = (ma60 - close_arr) / close_arr * 100
+        change = df['change_pct'].to_numpy()
+
+        cols = {
+            'rsi6': rsi6, 'kdj_k': kdj_k, 'bias20': bias20,
+            'close_arr': close_arr, 'stand_line': stand_line,
+            'slope_slowing': slope_slowing, 'vol_increase': vol_increase,
+            'vol_ratio': vol_ratio, 'avg_turnover_30': avg_turnover_30,
+            'potential': potential, 'change': change,
+        }
+
+        code = os.path.basename(f)[:6]
+        dates = df['日期'].to_numpy()
+        # 返回紧凑数组而不是逐笔 dict：numpy 数组按缓冲区 pickle，
+        # 跨进程传回的字节数和对象数都小一个量级
         res = []
-        for i in range(60, len(df) - 30):
-            row = df.iloc[i]
-            potential = (row['ma60'] - row['收盘']) / row['收盘'] * 100
-            change = (row['收盘'] - df.iloc[i-1]['收盘']) / df.iloc[i-1]['收盘'] * 100
-            avg_turnover_30 = df['换手率'].rolling(30).mean().iloc[i]
-
-            if (row['rsi6'] <= RSI6_MAX and row['kdj_k'] <= KDJ_K_MAX and
-                MIN_BIAS_20 <= row['bias20'] <= MAX_BIAS_20 and
-                row['收盘'] >= row['ma5'] * STAND_STILL_THRESHOLD and
-                row['slope_slowing'] and                
-                row['vol_increase'] and                 
-                MIN_VOLUME_RATIO <= row['vol_ratio'] <= MAX_VOLUME_RATIO and
-                avg_turnover_30 <= MAX_AVG_TURNOVER_30 and
-                potential >= MIN_PROFIT_POTENTIAL and
-                change <= MAX_TODAY_CHANGE):
-                
-                trade = {'代码': os.path.basename(f)[:6], '日期': row['日期']}
-                for p in [3, 5, 10, 20]:
-                    trade[f'{p}日收益'] = simulate_trade(df, i, p)
-                res.append(trade)
+        for set_name, params in PARAM_SETS.items():
+            idxs = scan_signals(cols, params)
+            if idxs.size == 0:
+                continue
+            rets = simulate_trades(close_arr, high_arr, low_arr, idxs, HOLD_PERIODS_ARR)
+            res.append((code, set_name, dates[idxs], rets))
         return res
     except: return []
 
 def main():
     print(f"🚀 执行最终强化回测逻辑...")
     files = glob.glob(os.path.join('stock_data', '*.csv'))
-    with Pool(cpu_count()) as p:
-        raw = p.map(process_file, files)
-    all_t = [t for sub in raw for t in sub]
-    if not all_t: 
+
+    os.makedirs('results', exist_ok=True)
+    out_path = 'results/backtest_final_optimized.csv'
+
+    # 流式落盘 + 流式汇总：信号边到边写，不在内存里攒一张大表。
+    # 汇总按参数组分开累计，多组阈值各出各的看板才有对比意义
+    n_sig = {s: 0 for s in PARAM_SETS}
+    wins = {s: {p: 0 for p in HOLD_PERIODS} for s in PARAM_SETS}
+    sums = {s: {p: 0.0 for p in HOLD_PERIODS} for s in PARAM_SETS}
+
+    multi_set = len(PARAM_SETS) > 1
+    header = ['代码', '日期'] + (['参数组'] if multi_set else []) \
+        + [f'{p}日收益' for p in HOLD_PERIODS]
+
+    # imap_unordered + chunksize：按批派发摊薄 IPC，结果边到边收
+    chunksize = max(1, len(files) // (cpu_count() * 4))
+    with open(out_path, 'w', newline='', encoding='utf_8_sig') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(header)
+        with Pool(cpu_count(), maxtasksperchild=200) as pool:
+            for sub in pool.imap_unordered(process_file, files, chunksize=chunksize):
+                for code, set_name, sig_dates, rets in sub:
+                    tag = [set_name] if multi_set else []
+                    for j in range(len(sig_dates)):
+                        writer.writerow([code, sig_dates[j]] + tag + list(rets[j]))
+                    # 胜率/均值按整批数组累计，不再逐笔取 dict
+                    n_sig[set_name] += len(sig_dates)
+                    for jj, p in enumerate(HOLD_PERIODS):
+                        sums[set_name][p] += float(rets[:, jj].sum())
+                        wins[set_name][p] += int((rets[:, jj] > 0).sum())
+
+    if sum(n_sig.values()) == 0:
+        os.remove(out_path)
         print("未发现信号")
         return
-    
-    df_res = pd.DataFrame(all_t)
-    print("\n--- 优化后实战看板 ---")
-    summary = []
-    for p in [3, 5, 10, 20]:
-        c = f'{p}日收益'
-        summary.append({
-            '周期': f'{p}天',
-            '胜率': f'{(df_res[c]>0).sum()/len(df_res)*100:.2f}%',
-            '平均收益': f'{df_res[c].mean():.2f}%',
-            '信号数': len(df_res)
-        })
-    print(pd.DataFrame(summary).to_string(index=False))
-    
-    os.makedirs('results', exist_ok=True)
-    df_res.to_csv('results/backtest_final_optimized.csv', index=False, encoding='utf_8_sig')
+
+    for set_name in PARAM_SETS:
+        n = n_sig[set_name]
+        if n == 0:
+            print(f"\n--- 优化后实战看板 [{set_name}]：未发现信号 ---")
+            continue
+        print(f"\n--- 优化后实战看板 [{set_name}] ---" if multi_set
+              else "\n--- 优化后实战看板 ---")
+        summary = []
+        for p in HOLD_PERIODS:
+            summary.append({
+                '周期': f'{p}天',
+                '胜率': f'{wins[set_name][p]/n*100:.2f}%',
+                '平均收益': f'{sums[set_name][p]/n:.2f}%',
+                '信号数': n
+            })
+        print(pd.DataFrame(summary).to_string(index=False))
 
 if __name__ == "__main__":
     main()
@@ -5,6 +5,14 @@ import pytz
 import glob
 from multiprocessing import Pool, cpu_count
 import numpy as np
+import pickle
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
 
 # ==================== 2025“防假突破”极致精选参数 ===================
 MIN_PRICE = 5.0              
@@ -29,76 +37,137 @@ MAX_TODAY_CHANGE = 4.0       # 允许适度涨幅以确认站稳
 
 SHANGHAI_TZ = pytz.timezone('Asia/Shanghai')
 STOCK_DATA_DIR = 'stock_data'
-NAME_MAP_FILE = 'stock_names.csv' 
+NAME_MAP_FILE = 'stock_names.csv'
+CACHE_DIR = 'cache'
+SCAN_COLS = ['收盘', '最高', '最低', '成交量', '换手率']
+# 缓存里多存一列日期，和回测脚本共用同一份 parquet
+CACHE_COLS = ['日期'] + SCAN_COLS
+
+def read_bars(file_path):
+    """只解析扫描用到的列；装了 pyarrow 时走 parquet 缓存（与回测共享），
+    缓存未命中才落到多线程 C 解析器，类型直接给定免推断。"""
+    if not HAS_PYARROW:
+        return pd.read_csv(file_path, usecols=SCAN_COLS)
+
+    cache_path = os.path.join(CACHE_DIR, os.path.basename(file_path).replace('.csv', '.parquet'))
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+        return pd.read_parquet(cache_path, columns=SCAN_COLS)
+
+    convert = pa_csv.ConvertOptions(
+        column_types={'日期': pa.string(), **{c: pa.float32() for c in SCAN_COLS}},
+        include_columns=CACHE_COLS)
+    df = pa_csv.read_csv(file_path, convert_options=convert).to_pandas()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    df.to_parquet(cache_path, index=False)
+    return df[SCAN_COLS]
+
+def load_name_map():
+    """stock_names.csv 未变时直接命中 pickle 缓存，免去重复解析和逐行 zfill；
+    固定路径 + mtime 新鲜度判断，失效规则与各 parquet 缓存一致"""
+    if not os.path.exists(NAME_MAP_FILE):
+        return {}
+    cache_path = os.path.join(CACHE_DIR, 'name_map.pkl')
+    if os.path.exists(cache_path) \
+            and os.path.getmtime(cache_path) >= os.path.getmtime(NAME_MAP_FILE):
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    n_df = pd.read_csv(NAME_MAP_FILE, dtype={'code': str})
+    name_map = dict(zip(n_df['code'].str.zfill(6), n_df['name']))
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(cache_path, 'wb') as f:
+        pickle.dump(name_map, f)
+    return name_map
+
+_NAME_MAP = {}
+
+def _init_worker(name_map):
+    # 名称表通过 initializer 每个 worker 只传一次，不再跟着每个任务反复 pickle
+    global _NAME_MAP
+    _NAME_MAP = name_map
 
-def process_single_stock(args):
-    file_path, name_map = args
+def process_single_stock(file_path):
     code = os.path.basename(file_path).split('.')[0]
-    
+
     try:
-        df = pd.read_csv(file_path)
+        df = read_bars(file_path)
         if len(df) < 70: return None
-        
-        close = df['收盘']
-        vol = df['成交量']
-        
+
+        # 扫描只看最后一根K线：全部指标只在尾部窗口上算，
+        # 不再生成整条 rolling 序列然后只取 .iloc[-1]
+        close = df['收盘'].to_numpy(dtype=np.float64)
+        vol = df['成交量'].to_numpy(dtype=np.float64)
+        high = df['最高'].to_numpy(dtype=np.float64)
+        low = df['最低'].to_numpy(dtype=np.float64)
+        turn = df['换手率'].to_numpy(dtype=np.float64)
+
         # 1. 指标计算
-        # RSI6
-        delta = close.diff()
-        gain = (delta.where(delta > 0, 0)).rolling(6).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(6).mean()
-        rsi6 = 100 - (100 / (1 + (gain.iloc[-1] / loss.iloc[-1]))) if loss.iloc[-1] != 0 else 100
-        
-        # KDJ_K
-        low_9 = df['最低'].rolling(9).min()
-        high_9 = df['最高'].rolling(9).max()
-        kdj_k = ((close - low_9) / (high_9 - low_9) * 100).ewm(com=2).mean().iloc[-1]
-        
+        # RSI6：最近6个涨跌幅即可
+        delta = np.diff(close[-7:])
+        gain = delta[delta > 0].sum() / 6
+        loss = -delta[delta < 0].sum() / 6
+        rsi6 = 100 - (100 / (1 + gain / loss)) if loss != 0 else 100
+
+        # KDJ_K：EWM 权重 (2/3)^40 ≈ 2e-8，取尾部40根跑递推即可与全量一致
+        alpha = 1.0 / 3.0
+        num, den = 0.0, 0.0
+        for i in range(len(close) - 40, len(close)):
+            low_9 = low[i - 8:i + 1].min()
+            high_9 = high[i - 8:i + 1].max()
+            if high_9 != low_9:
+                raw = (close[i] - low_9) / (high_9 - low_9) * 100.0
+                num = (1.0 - alpha) * num + raw
+                den = (1.0 - alpha) * den + 1.0
+            else:
+                num = (1.0 - alpha) * num
+                den = (1.0 - alpha) * den
+        kdj_k = num / den if den > 0 else 100.0
+
         # MA & BIAS
-        ma5 = close.rolling(5).mean()
-        ma20 = close.rolling(20).mean().iloc[-1]
-        ma60 = close.rolling(60).mean().iloc[-1]
-        bias20 = (close.iloc[-1] - ma20) / ma20 * 100
-        
+        ma5 = close[-5:].mean()
+        ma5_prev = close[-6:-1].mean()
+        ma5_prev2 = close[-7:-2].mean()
+        ma20 = close[-20:].mean()
+        ma60 = close[-60:].mean()
+        bias20 = (close[-1] - ma20) / ma20 * 100
+
         # 2. 【核心新增】跌势衰竭确认：5日线斜率趋缓
         # 今天的MA5下降幅度小于昨天的下降幅度，说明跌势在减弱
-        ma5_diff_today = ma5.iloc[-1] - ma5.iloc[-2]
-        ma5_diff_yesterday = ma5.iloc[-2] - ma5.iloc[-3]
-        slope_slowing = ma5_diff_today > ma5_diff_yesterday
-        
+        slope_slowing = (ma5 - ma5_prev) > (ma5_prev - ma5_prev2)
+
         # 3. 量能确认
-        vol_ma5 = vol.shift(1).rolling(5).mean().iloc[-1]
-        vol_ratio = vol.iloc[-1] / vol_ma5
+        vol_ma5 = vol[-6:-1].mean()
+        vol_ratio = vol[-1] / vol_ma5
         # 量增确认：今日量 > 昨日量
-        vol_increase = vol.iloc[-1] > vol.iloc[-2] 
-        
+        vol_increase = vol[-1] > vol[-2]
+
         # 辅助信息
-        potential = (ma60 - close.iloc[-1]) / close.iloc[-1] * 100
-        change = (close.iloc[-1] - close.iloc[-2]) / close.iloc[-2] * 100
-        avg_turnover_30 = df['换手率'].rolling(30).mean().iloc[-1]
+        potential = (ma60 - close[-1]) / close[-1] * 100
+        change = (close[-1] - close[-2]) / close[-2] * 100
+        avg_turnover_30 = turn[-30:].mean()
 
         # ================= 严格筛选条件 =================
-        if (close.iloc[-1] >= MIN_PRICE and
+        if (close[-1] >= MIN_PRICE and
             avg_turnover_30 <= MAX_AVG_TURNOVER_30 and
             rsi6 <= RSI6_MAX and
             kdj_k <= KDJ_K_MAX and
             MIN_BIAS_20 <= bias20 <= MAX_BIAS_20 and
-            close.iloc[-1] >= ma5.iloc[-1] * STAND_STILL_THRESHOLD and 
+            close[-1] >= ma5 * STAND_STILL_THRESHOLD and
             slope_slowing and                                 # 跌势趋缓确认
             vol_increase and                                  # 主动买入确认
             MIN_VOLUME_RATIO <= vol_ratio <= MAX_VOLUME_RATIO and
             potential >= MIN_PROFIT_POTENTIAL and
             change <= MAX_TODAY_CHANGE):
 
+            # 数值原样返回，百分号之类的格式化留给主进程一次性做
             return {
                 '代码': code,
-                '名称': name_map.get(code, "未知"),
-                '现价': close.iloc[-1],
-                '今日量比': round(vol_ratio, 2),
-                'RSI6': round(rsi6, 1),
-                '20日乖离': f"{round(bias20, 1)}%",
-                '反弹空间': f"{round(potential, 1)}%",
-                '今日涨跌': f"{round(change, 1)}%"
+                '名称': _NAME_MAP.get(code, "未知"),
+                '现价': close[-1],
+                '今日量比': vol_ratio,
+                'RSI6': rsi6,
+                '20日乖离': bias20,
+                '反弹空间': potential,
+                '今日涨跌': change
             }
     except:
         return None
@@ -107,24 +176,25 @@ def main():
     now_shanghai = datetime.now(SHANGHAI_TZ)
     print(f"🚀 极致缩量精选扫描开始... 目标：56%胜率确认信号 ({now_shanghai.strftime('%Y-%m-%d %H:%M')})")
 
-    name_map = {}
-    if os.path.exists(NAME_MAP_FILE):
-        n_df = pd.read_csv(NAME_MAP_FILE, dtype={'code': str})
-        name_map = dict(zip(n_df['code'].str.zfill(6), n_df['name']))
+    name_map = load_name_map()
 
     file_list = glob.glob(os.path.join(STOCK_DATA_DIR, '*.csv'))
-    tasks = [(file_path, name_map) for file_path in file_list]
-
-    with Pool(processes=cpu_count()) as pool:
-        raw_results = pool.map(process_single_stock, tasks)
 
-    results = [r for r in raw_results if r is not None]
+    with Pool(processes=cpu_count(), initializer=_init_worker, initargs=(name_map,)) as pool:
+        raw_results = pool.imap_unordered(process_single_stock, file_list, chunksize=32)
+        results = [r for r in raw_results if r is not None]
         
     if results:
         df_result = pd.DataFrame(results)
         # 排序：RSI6 越低代表反弹张力越大
         df_result = df_result.sort_values(by='RSI6', ascending=True)
-        
+
+        # 展示格式统一在这里向量化补上
+        df_result['今日量比'] = df_result['今日量比'].round(2)
+        df_result['RSI6'] = df_result['RSI6'].round(1)
+        for col in ['20日乖离', '反弹空间', '今日涨跌']:
+            df_result[col] = df_result[col].round(1).astype(str) + '%'
+
         print(f"\n🎯 扫描完成，精选出 {len(results)} 只“高质量止跌”标的：")
         print("⚠️  实战纪律：买入后3日内利润若低于 1%，请执行生命线离场。")
         print("-" * 80)
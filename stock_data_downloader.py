@@ -1,14 +1,45 @@
 import os
+import csv
+import json
+import tempfile
+import threading
 import pandas as pd
 import akshare as ak
 import time
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import sys
 
 # 配置路径
 DATA_DIR = "stock_data"
 FILTERED_LIST_PATH = os.path.join(DATA_DIR, "filtered_stock_list.csv")
-CHECKPOINT_PATH = os.path.join(DATA_DIR, "checkpoint.txt") 
+CHECKPOINT_PATH = os.path.join(DATA_DIR, "checkpoint.txt")
+
+# 下载是纯网络等待，用少量线程重叠 RTT；别开太大，尊重接口频控
+DOWNLOAD_WORKERS = 4
+
+# 每只股票的最后日期记在 sidecar 里，增量判断 O(1)，不用整读历史 CSV
+LAST_DATES_PATH = os.path.join(DATA_DIR, "last_dates.json")
+_last_dates = {}
+_last_dates_lock = threading.Lock()
+
+def load_last_dates():
+    global _last_dates
+    if os.path.exists(LAST_DATES_PATH):
+        try:
+            with open(LAST_DATES_PATH, 'r') as f:
+                _last_dates = json.load(f)
+        except Exception:
+            _last_dates = {}
+
+def save_last_dates():
+    """tempfile + os.replace 原子落盘，中断不会留下半个 json"""
+    with _last_dates_lock:
+        snapshot = dict(_last_dates)
+    fd, tmp_path = tempfile.mkstemp(dir=DATA_DIR, suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp_path, LAST_DATES_PATH)
 
 COLUMN_MAPPING = {
     "日期": "日期", "开盘": "开盘", "收盘": "收盘", "最高": "最高",
@@ -16,49 +47,84 @@ COLUMN_MAPPING = {
     "振幅": "振幅", "涨跌幅": "涨跌幅", "涨跌额": "涨跌额", "换手率": "换手率"
 }
 TARGET_COLUMNS = ['日期', '股票代码', '开盘', '收盘', '最高', '最低', '成交量', '成交额', '振幅', '涨跌幅', '涨跌额', '换手率']
+ROUND2_COLS = ['开盘', '收盘', '最高', '最低', '振幅', '涨跌幅', '涨跌额', '换手率']
+
+def _tail_date(path):
+    """从文件末尾倒读最后一行拿日期，O(1)，完全不过 CSV 解析器"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() < 2:
+            return None
+        f.seek(-2, os.SEEK_END)
+        while f.tell() > 0 and f.read(1) != b'\n':
+            f.seek(-2, os.SEEK_CUR)
+        last = f.readline().decode('utf-8').strip()
+    # 只有表头（或空行）时视为无数据
+    if not last or last.startswith('日期'):
+        return None
+    return last.split(',')[0]
 
 def download_item(symbol_short):
     """处理单个股票的增量下载"""
     file_path = os.path.join(DATA_DIR, f"{symbol_short}.csv")
     try:
-        existing_dates = set()
+        last_date = None
         start_date = "19900101"
-        
-        # 1. 检查本地数据，获取增量起始点
+
+        # 1. 增量起始点：sidecar 只在整批成功后才落盘，而 CSV 在单票完成时
+        # 就已追加；中途失败重试时 sidecar 可能落后于文件末行，只信 sidecar
+        # 会把上次写入的行再追加一遍。所以文件存在时必须回看末行日期
+        # （_tail_date 本身 O(1)），取两者较大者做截断基准
+        if symbol_short in _last_dates:
+            last_date = str(_last_dates[symbol_short])
         if os.path.exists(file_path):
             try:
-                existing_df = pd.read_csv(file_path)
-                if not existing_df.empty:
-                    existing_dates = set(existing_df['日期'].astype(str).tolist())
-                    # 取最后一行日期，去除横杠作为接口起始时间
-                    last_date = str(existing_df.iloc[-1]['日期']).replace("-", "")
-                    start_date = last_date
+                tail = _tail_date(file_path)
+                if tail is not None and (last_date is None or tail > last_date):
+                    last_date = tail
+                    # 同步进 sidecar，保持两边一致
+                    with _last_dates_lock:
+                        _last_dates[symbol_short] = last_date
             except Exception as e:
                 print(f"读取旧文件失败 {symbol_short}, 重新全量下载: {e}")
+        if last_date is not None:
+            start_date = last_date.replace("-", "")
 
         # 2. 调用 akshare 接口
         df = ak.stock_zh_a_hist(symbol=symbol_short, period="daily", start_date=start_date, adjust="")
-        
+
         if df is not None and not df.empty:
             df = df.rename(columns=COLUMN_MAPPING)
             df['股票代码'] = symbol_short
             df['日期'] = df['日期'].astype(str)
-            
-            # 3. 严格去重：只保留本地不存在的日期
-            df = df[~df['日期'].isin(existing_dates)]
-            
+
+            # 3. 去重：ISO 日期串可直接按字典序比较，只留最后日期之后的行
+            if last_date is not None:
+                df = df[df['日期'] > last_date]
+
             if not df.empty:
                 # 格式化数据
                 df['成交额'] = df['成交额'].round(1)
-                for col in ['开盘', '收盘', '最高', '最低', '振幅', '涨跌幅', '涨跌额', '换手率']:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').round(2)
+                # 整块一次转数值再一次 round，不逐列各跑一遍
+                df[ROUND2_COLS] = df[ROUND2_COLS].apply(pd.to_numeric, errors='coerce').round(2)
                 df['成交量'] = df['成交量'].astype(int)
                 
                 df = df[TARGET_COLUMNS]
                 header = not os.path.exists(file_path)
-                # 追加模式写入 CSV
-                df.to_csv(file_path, mode='a', index=False, header=header, encoding='utf-8')
-        
+                # 日常增量就几行，直接 csv.writer 追加，跳过 to_csv 的整套启动开销；
+                # NaN 写成空串，与 to_csv 的输出保持一致
+                with open(file_path, 'a', encoding='utf-8', newline='') as fh:
+                    # csv.writer 默认 \r\n；历史文件是 to_csv 写的 \n，
+                    # 显式指定避免增量行混入 CRLF
+                    writer = csv.writer(fh, lineterminator='\n')
+                    if header:
+                        writer.writerow(TARGET_COLUMNS)
+                    for row in df.itertuples(index=False):
+                        writer.writerow(['' if (isinstance(v, float) and v != v) else v
+                                         for v in row])
+                with _last_dates_lock:
+                    _last_dates[symbol_short] = df['日期'].iloc[-1]
+
         time.sleep(0.2) # 接口保护频控
         return True
     except Exception as e:
@@ -89,6 +155,8 @@ def main():
     except:
         start_index = 0
 
+    load_last_dates()
+
     print(f"📊 当前下载进度: {start_index}/{len(symbols)}")
 
     if start_index >= len(symbols):
@@ -96,17 +164,21 @@ def main():
         with open(CHECKPOINT_PATH, 'w') as f: f.write('0')
         return
 
-    # 按顺序执行下载
-    for i in range(start_index, len(symbols)):
-        success = download_item(symbols[i])
-        if success:
-            # 每成功一只，实时更新断点
-            with open(CHECKPOINT_PATH, 'w') as f:
-                f.write(str(i + 1))
-        else:
-            # 失败则打印当前代码并退出，由 Workflow 触发重试
-            print(f"🛑 任务中断于 index {i} (代码: {symbols[i]})")
-            sys.exit(1)
+    # 分批并发下载：每批内线程重叠网络等待，整批成功后才推进断点，
+    # 保证断点始终是"已完成前缀"，重试语义和串行版完全一致
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        for batch_start in range(start_index, len(symbols), DOWNLOAD_WORKERS):
+            batch = symbols[batch_start:batch_start + DOWNLOAD_WORKERS]
+            results = list(executor.map(download_item, batch))
+            if all(results):
+                with open(CHECKPOINT_PATH, 'w') as f:
+                    f.write(str(batch_start + len(batch)))
+                save_last_dates()
+            else:
+                # 失败则打印当前批次并退出，由 Workflow 触发重试
+                fail_idx = batch_start + results.index(False)
+                print(f"🛑 任务中断于 index {fail_idx} (代码: {symbols[fail_idx]})")
+                sys.exit(1)
 
     print("🎉 本轮下载任务顺利执行完毕。")
 
@@ -1,6 +1,7 @@
 import os
 import akshare as ak
 import pandas as pd
+import numpy as np
 
 DATA_DIR = "stock_data"
 if not os.path.exists(DATA_DIR):
@@ -16,25 +17,21 @@ def main():
     df.to_csv(RAW_LIST_PATH, index=False, encoding='utf-8-sig')
     
     # --- 过滤逻辑升级 ---
+    # 条件一次合成单个掩码，只切一次，不生成三份中间 DataFrame：
     # 1. 排除 ST (包含 *ST)
-    df = df[~df['名称'].str.contains("ST", na=False)]
-    
     # 2. 排除 30 开头 (创业板)
-    df = df[~df['代码'].astype(str).str.startswith("30")]
-    
     # 3. 排除北交所 (代码以 8, 9, 4 开头)
-    df = df[~df['代码'].astype(str).str.startswith(('8', '9', '4'))]
-    
     # 4. 只要深沪 A 股 (逻辑上由上述排除后剩下 60, 00, 688 开头为主)
     # 5. 价格过滤: 5.0 <= 最新价 <= 20.0
-    df = df[(df['最新价'] >= 5.0) & (df['最新价'] <= 20.0)]
-    
-    # 转换代码格式适配 yfinance (用于下载脚本读取)
-    def format_code(c):
-        c_str = str(c).zfill(6)
-        return f"{c_str}.SS" if c_str.startswith('6') else f"{c_str}.SZ"
-    
-    df['yf_code'] = df['代码'].apply(format_code)
+    codes = df['代码'].astype(str)
+    mask = (~df['名称'].str.contains("ST", na=False)) \
+        & (~codes.str.startswith(("30", "8", "9", "4"))) \
+        & df['最新价'].between(5.0, 20.0)
+    df = df.loc[mask].copy()
+
+    # 转换代码格式适配 yfinance (用于下载脚本读取)，np.where 向量化拼后缀
+    codes = df['代码'].astype(str).str.zfill(6)
+    df['yf_code'] = np.where(codes.str.startswith('6'), codes + '.SS', codes + '.SZ')
     
     # 保存精简名单
     df.to_csv(FILTERED_LIST_PATH, index=False, encoding='utf-8-sig')
@@ -5,12 +5,114 @@ import glob
 from datetime import datetime
 from multiprocessing import Pool, cpu_count
 
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+    # 没装 numba 时退化为纯 Python 执行，逻辑完全一致
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        def wrap(func):
+            return func
+        return wrap
+
 # --- 核心配置 ---
 DATA_DIR = "stock_data"
 NAME_MAP_FILE = 'stock_names.csv'
-LOOKBACK_WINDOW = 120  
-HOLD_DAYS = 10         
-STOP_LOSS_PCT = -5.0   
+CACHE_DIR = 'cache'
+LOOKBACK_WINDOW = 120
+HOLD_DAYS = 10
+STOP_LOSS_PCT = -5.0
+
+# V6 回测要用开盘价，列集和扫描器的缓存不同，parquet 单独留一个后缀
+BT_COLS = ['日期', '开盘', '收盘', '最高', '最低', '成交量']
+# 指标缓存版本号：calculate_indicators 的算法一变就 +1，旧缓存自动失效
+IND_VER = 3
+# EWM 暖机长度：180 根之后 adjust=False 的初值残余 < 1e-6，对条件判断无影响
+WARMUP_BARS = 180
+
+def load_bars(file_path):
+    """只解析回测用到的六列；装了 pyarrow 时走 mtime 失效的 parquet 缓存。"""
+    if not HAS_PYARROW:
+        df = pd.read_csv(file_path, usecols=BT_COLS)
+        # 价格量能 float32 足够，省一半内存带宽
+        for c in BT_COLS[1:]:
+            df[c] = df[c].astype(np.float32)
+        return df
+
+    cache_path = os.path.join(
+        CACHE_DIR, os.path.basename(file_path).replace('.csv', '.v6.parquet'))
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+        return pd.read_parquet(cache_path)
+
+    convert = pa_csv.ConvertOptions(
+        column_types={'日期': pa.string(), **{c: pa.float32() for c in BT_COLS[1:]}},
+        include_columns=BT_COLS)
+    df = pa_csv.read_csv(file_path, convert_options=convert).to_pandas()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    df.to_parquet(cache_path, index=False)
+    return df
+
+@njit(cache=True)
+def _ewm_kernel(close, rsv):
+    """一趟遍历同时推进五条 EWM 递推：K、D、EMA12、EMA26、DEA。
+
+    K/D 按 pandas ewm(com=2) 默认 adjust=True 的分子/分母对递推
+    （rsv 为 NaN 时两者同步衰减），MACD 三条按 adjust=False 直接递推，
+    结果与逐列调 pandas 完全一致，但 close 只从内存过一遍。"""
+    n = len(close)
+    k = np.full(n, np.nan)
+    d = np.full(n, np.nan)
+    dif = np.empty(n)
+    dea = np.empty(n)
+    a = 1.0 / 3.0
+    a12 = 2.0 / 13.0
+    a26 = 2.0 / 27.0
+    a9 = 2.0 / 10.0
+    num_k, den_k = 0.0, 0.0
+    num_d, den_d = 0.0, 0.0
+    e12 = close[0]
+    e26 = close[0]
+    dea_v = 0.0
+    for i in range(n):
+        if i > 0:
+            e12 = (1.0 - a12) * e12 + a12 * close[i]
+            e26 = (1.0 - a26) * e26 + a26 * close[i]
+        dif_v = e12 - e26
+        if i == 0:
+            dea_v = dif_v
+        else:
+            dea_v = (1.0 - a9) * dea_v + a9 * dif_v
+        dif[i] = dif_v
+        dea[i] = dea_v
+
+        r = rsv[i]
+        if r == r:  # 非 NaN
+            num_k = (1.0 - a) * num_k + r
+            den_k = (1.0 - a) * den_k + 1.0
+        else:
+            num_k = (1.0 - a) * num_k
+            den_k = (1.0 - a) * den_k
+        if den_k > 0.0:
+            kv = num_k / den_k
+            k[i] = kv
+            num_d = (1.0 - a) * num_d + kv
+            den_d = (1.0 - a) * den_d + 1.0
+        else:
+            num_d = (1.0 - a) * num_d
+            den_d = (1.0 - a) * den_d
+        if den_d > 0.0:
+            d[i] = num_d / den_d
+    return k, d, dif, dea
 
 def calculate_indicators(df):
     close = df['Close']
@@ -26,117 +128,202 @@ def calculate_indicators(df):
     loss = (-delta.where(delta < 0, 0)).rolling(6).mean()
     df['RSI6'] = 100 - (100 / (1 + gain/loss))
     
-    # 3. KDJ
+    # 3. KDJ + 4. MACD (V6 加速逻辑)
     low_9 = df['Low'].rolling(9).min()
     high_9 = df['High'].rolling(9).max()
     rsv = (close - low_9) / (high_9 - low_9) * 100
-    df['K'] = rsv.ewm(com=2).mean()
-    df['D'] = df['K'].ewm(com=2).mean()
-    
-    # 4. MACD (V6 加速逻辑)
-    exp1 = close.ewm(span=12, adjust=False).mean()
-    exp2 = close.ewm(span=26, adjust=False).mean()
-    df['DIF'] = exp1 - exp2
-    df['DEA'] = df['DIF'].ewm(span=9, adjust=False).mean()
+    if HAS_NUMBA:
+        # 五条 EWM 融合成一趟递推，省掉五次整列扫描
+        k, d, dif, dea = _ewm_kernel(
+            close.to_numpy(dtype=np.float64), rsv.to_numpy(dtype=np.float64))
+        df['K'] = k
+        df['D'] = d
+        df['DIF'] = dif
+        df['DEA'] = dea
+    else:
+        df['K'] = rsv.ewm(com=2).mean()
+        df['D'] = df['K'].ewm(com=2).mean()
+        exp1 = close.ewm(span=12, adjust=False).mean()
+        exp2 = close.ewm(span=26, adjust=False).mean()
+        df['DIF'] = exp1 - exp2
+        df['DEA'] = df['DIF'].ewm(span=9, adjust=False).mean()
     df['MACD_HIST'] = (df['DIF'] - df['DEA']) * 2
-    
+
+    # 5. 突破基准：前40日最高价（不含当日），一次算好免得循环里反复切片。
+    # sliding_window_view 的窗口矩阵是零拷贝视图，max(axis=1) 是单次 SIMD
+    # 归约，比 shift+rolling 的 Series 链路少两份全长中间数组；
+    # 窗口 j 盖住 high[j:j+40]，所以第 i 根的"前40日"就是第 i-40 个窗口
+    high_np = df['High'].to_numpy(dtype=np.float64)
+    h40 = np.full(len(high_np), np.nan)
+    if len(high_np) >= 41:
+        h40[40:] = np.lib.stride_tricks.sliding_window_view(high_np, 40).max(axis=1)[:-1]
+    df['HIGH40_PREV'] = h40
+
+    return df
+
+@njit(cache=True)
+def _detect_signals(ma5, ma10, ma20, dif, dea, hist, rsi6, k, d,
+                    open_, close, vol, ma5v, h40, start, end):
+    """V6 六条件选股：一趟原生循环扫完候选区间，返回触发日下标。
+
+    NaN 与任何比较都为 False，与原 iloc 逐行判断的行为一致。"""
+    out = np.empty(end - start, dtype=np.int64)
+    n = 0
+    for i in range(start, end):
+        if (ma5[i] > ma10[i] and ma10[i] > ma20[i] and           # 条件1：均线发散
+                close[i] > h40[i] * 1.01 and close[i] > open_[i] and  # 条件2：破40日高收阳
+                dif[i] > dea[i] and hist[i] > hist[i - 1] * 1.1 and   # 条件3：MACD红柱加速
+                rsi6[i] > 65 and rsi6[i] < 82 and                # 条件4a：RSI强势区
+                k[i] > d[i] and k[i - 1] <= d[i - 1] and         # 条件4b：KDJ金叉
+                vol[i] > 2.0 * ma5v[i] and vol[i] < 4.5 * ma5v[i]):   # 条件5：温和放量
+            out[n] = i
+            n += 1
+    return out[:n]
+
+def _detect_signals_np(ma5, ma10, ma20, dif, dea, hist, rsi6, k, d,
+                       open_, close, vol, ma5v, h40, start, end):
+    """_detect_signals 的向量化等价实现：六组条件整列算成布尔掩码再按位与。
+
+    没装 numba 时走这条路径，不必逐根K线跑纯 Python 判断。"""
+    prev_hist = np.concatenate(([np.nan], hist[:-1]))
+    prev_k = np.concatenate(([np.nan], k[:-1]))
+    prev_d = np.concatenate(([np.nan], d[:-1]))
+    with np.errstate(invalid='ignore'):
+        mask = ((ma5 > ma10) & (ma10 > ma20) &                  # 条件1：均线发散
+                (close > h40 * 1.01) & (close > open_) &        # 条件2：破40日高收阳
+                (dif > dea) & (hist > prev_hist * 1.1) &        # 条件3：MACD红柱加速
+                (rsi6 > 65) & (rsi6 < 82) &                     # 条件4a：RSI强势区
+                (k > d) & (prev_k <= prev_d) &                  # 条件4b：KDJ金叉
+                (vol > 2.0 * ma5v) & (vol < 4.5 * ma5v))        # 条件5：温和放量
+    idxs = np.flatnonzero(mask)
+    return idxs[(idxs >= start) & (idxs < end)]
+
+if not HAS_NUMBA:
+    _detect_signals = _detect_signals_np
+
+def load_indicators(file_path):
+    """读取算好指标的K线表；数据没更新时直接命中 sidecar，跳过整套指标计算。"""
+    ind_path = os.path.join(
+        CACHE_DIR, os.path.basename(file_path).replace('.csv', f'.v6ind{IND_VER}.parquet'))
+    if HAS_PYARROW and os.path.exists(ind_path) \
+            and os.path.getmtime(ind_path) >= os.path.getmtime(file_path):
+        return pd.read_parquet(ind_path)
+
+    df = load_bars(file_path)
+    if len(df) < 100: return None
+    # 信号只扫最近 LOOKBACK_WINDOW 根；指标只要再往前留足暖机段，
+    # 多年的早期历史不必参与任何 rolling/EWM 计算
+    if len(df) > LOOKBACK_WINDOW + WARMUP_BARS:
+        df = df.tail(LOOKBACK_WINDOW + WARMUP_BARS).reset_index(drop=True)
+    df.columns = df.columns.str.strip()
+    df.rename(columns={'日期':'Date','收盘':'Close','开盘':'Open','最高':'High','最低':'Low','成交量':'Volume'}, inplace=True)
+    df = calculate_indicators(df)
+    if HAS_PYARROW:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        df.to_parquet(ind_path, index=False)
     return df
 
 def run_backtest_on_file(file_path):
     code = os.path.basename(file_path).split('.')[0]
-    if not (code.startswith('60') or code.startswith('00')): return None
-    
+
+    # try 只包住读盘/解析；指标和扫描阶段的异常直接抛出来，
+    # 静默吞掉只会把逻辑 bug 伪装成"无信号"
     try:
-        df = pd.read_csv(file_path)
-        if len(df) < 100: return None
-        df.columns = df.columns.str.strip()
-        df.rename(columns={'日期':'Date','收盘':'Close','开盘':'Open','最高':'High','最低':'Low','成交量':'Volume'}, inplace=True)
-        df = calculate_indicators(df)
-        
-        results = []
-        start_idx = len(df) - LOOKBACK_WINDOW
-        if start_idx < 65: start_idx = 65
-        
-        for i in range(start_idx, len(df) - 1):
-            curr = df.iloc[i]
-            prev = df.iloc[i-1]
-            
-            # --- V6 同步实战筛选条件 ---
-            # 条件1：均线发散（MA5 > MA10 > MA20）
-            is_trend = (curr['MA5'] > curr['MA10'] > curr['MA20'])
-            
-            # 条件2：突破40日新高且收阳线
-            prev_high_40 = df['High'].iloc[i-40:i].max()
-            is_breakout = (curr['Close'] > prev_high_40 * 1.01) and (curr['Close'] > curr['Open'])
-            
-            # 条件3：MACD红柱加速 (对齐实战 1.1倍)
-            is_macd = (curr['DIF'] > curr['DEA']) and (curr['MACD_HIST'] > prev['MACD_HIST'] * 1.1)
-            
-            # 条件4：RSI强势区 + KDJ金叉
-            is_rsi = (65 < curr['RSI6'] < 82)
-            is_kdj = (curr['K'] > curr['D']) and (prev['K'] <= prev['D'])
-            
-            # 条件5：温和放量
-            is_vol = (2.0 * curr['MA5V'] < curr['Volume'] < 4.5 * curr['MA5V'])
-
-            if is_trend and is_breakout and is_macd and is_rsi and is_kdj and is_vol:
-                # --- V6 核心：实战入场限制 ---
-                # 获取次日数据
-                next_day = df.iloc[i+1]
-                # 计算次日开盘涨幅
-                open_jump = ((next_day['Open'] - curr['Close']) / curr['Close']) * 100
-                
-                # 如果次日高开超过 4.5%，实战中我们会放弃，所以回测也要剔除
-                if not (-1.0 < open_jump < 4.5): continue 
-
-                post_df = df.iloc[i+1 : i+1+HOLD_DAYS]
-                if post_df.empty: continue
-                
-                final_ret, max_reach, is_stopped = 0.0, 0.0, False
-                triggered_price = curr['Close']
-                
-                # 逐日追踪 10 日表现
-                for _, row in post_df.iterrows():
-                    day_high_reach = ((row['High'] - triggered_price) / triggered_price) * 100
-                    max_reach = max(max_reach, day_high_reach)
-                    
-                    # 5% 强制止损 (实战守则)
-                    day_low_ret = ((row['Low'] - triggered_price) / triggered_price) * 100
-                    if day_low_ret <= STOP_LOSS_PCT:
-                        final_ret = STOP_LOSS_PCT
-                        is_stopped = True
-                        break
-                    
-                    final_ret = ((row['Close'] - triggered_price) / triggered_price) * 100
-                
-                results.append({
-                    "代码": code, "触发日期": curr['Date'], "触发价": curr['Close'],
-                    "T+1开盘涨幅": round(open_jump, 2),
-                    "最高冲击%": round(max_reach, 2), 
-                    "持有10日收益%": round(final_ret, 2),
-                    "MACD增速": round(curr['MACD_HIST'] / prev['MACD_HIST'], 2) if prev['MACD_HIST'] != 0 else 0,
-                    "状态": "止损离场" if is_stopped else "持有期满"
-                })
-        return results
-    except: return None
+        df = load_indicators(file_path)
+    except Exception as e:
+        print(f"⚠️ 读取失败 {os.path.basename(file_path)}: {e}")
+        return None
+    if df is None or len(df) < 100: return None
+
+    results = []
+    start_idx = len(df) - LOOKBACK_WINDOW
+    if start_idx < 65: start_idx = 65
+
+    # 每列只抽一次 numpy 数组，信号判定和后续结算都在数组上做
+    dates = df['Date'].to_numpy()
+    open_arr = df['Open'].to_numpy(dtype=np.float64)
+    close_arr = df['Close'].to_numpy(dtype=np.float64)
+    high_arr = df['High'].to_numpy(dtype=np.float64)
+    low_arr = df['Low'].to_numpy(dtype=np.float64)
+    vol_arr = df['Volume'].to_numpy(dtype=np.float64)
+    hist_arr = df['MACD_HIST'].to_numpy()
+
+    # --- V6 同步实战筛选条件：整段区间先在内核里一趟选完 ---
+    sig_idxs = _detect_signals(
+        df['MA5'].to_numpy(), df['MA10'].to_numpy(), df['MA20'].to_numpy(),
+        df['DIF'].to_numpy(), df['DEA'].to_numpy(), hist_arr,
+        df['RSI6'].to_numpy(), df['K'].to_numpy(), df['D'].to_numpy(),
+        open_arr, close_arr, vol_arr, df['MA5V'].to_numpy(),
+        df['HIGH40_PREV'].to_numpy(), start_idx, len(df) - 1)
+
+    for i in sig_idxs:
+        # --- V6 核心：实战入场限制 ---
+        # 计算次日开盘涨幅
+        open_jump = (open_arr[i+1] - close_arr[i]) / close_arr[i] * 100
+
+        # 如果次日高开超过 4.5%，实战中我们会放弃，所以回测也要剔除
+        if not (-1.0 < open_jump < 4.5): continue
+
+        triggered_price = close_arr[i]
+        highs = high_arr[i+1 : i+1+HOLD_DAYS]
+        lows = low_arr[i+1 : i+1+HOLD_DAYS]
+        closes = close_arr[i+1 : i+1+HOLD_DAYS]
+        if highs.size == 0: continue
+
+        # 10 日持有期整窗向量化：先找首个止损日，再在窗内取最高冲击
+        low_rets = (lows - triggered_price) / triggered_price * 100
+        stop_hits = low_rets <= STOP_LOSS_PCT   # 5% 强制止损 (实战守则)
+        if stop_hits.any():
+            stop_idx = int(stop_hits.argmax())
+            final_ret = STOP_LOSS_PCT
+            is_stopped = True
+            # 止损当日仍计入冲高；之后的行情与持仓无关
+            high_max = highs[:stop_idx + 1].max()
+        else:
+            final_ret = (closes[-1] - triggered_price) / triggered_price * 100
+            is_stopped = False
+            high_max = highs.max()
+        max_reach = max(0.0, (high_max - triggered_price) / triggered_price * 100)
+
+        # 原始数值打包成元组返回，列名、取整和状态文案统一在 main 里补
+        macd_accel = hist_arr[i] / hist_arr[i-1] if hist_arr[i-1] != 0 else 0.0
+        results.append((code, dates[i], close_arr[i], open_jump,
+                        max_reach, final_ret, macd_accel, is_stopped))
+    return results
 
 def main():
     names_df = pd.read_csv(NAME_MAP_FILE, dtype={'code': str})
     names_dict = dict(zip(names_df['code'].str.zfill(6), names_df['name']))
-    files = glob.glob(os.path.join(DATA_DIR, "*.csv"))
-    
+    # 代码前缀直接看文件名，行数不足用文件大小粗筛（100行 ≈ 6KB），
+    # 不合格的文件连进程池都不进
+    files = [f for f in glob.glob(os.path.join(DATA_DIR, "*.csv"))
+             if os.path.basename(f).startswith(('60', '00'))
+             and os.path.getsize(f) >= 4096]
+
     print(f"⌛ [V6同步版] 正在对齐实战逻辑并运行回测...")
     
+    # imap_unordered + chunksize：按批派发摊薄 IPC，空结果边到边丢弃
+    chunksize = max(1, len(files) // (cpu_count() * 8))
+    flattened = []
     with Pool(cpu_count()) as pool:
-        all_results = pool.map(run_backtest_on_file, files)
-    
-    flattened = [item for sublist in all_results if sublist for item in sublist]
+        for sublist in pool.imap_unordered(run_backtest_on_file, files, chunksize=chunksize):
+            if sublist:
+                flattened.extend(sublist)
     if not flattened:
         print("未发现符合 V6 严苛条件的信号。")
         return
 
-    res_df = pd.DataFrame(flattened)
-    res_df['名称'] = res_df['代码'].apply(lambda x: names_dict.get(x, "未知"))
+    # 一次性从元组列表建表，schema 不用逐行猜；取整整列做
+    res_df = pd.DataFrame(flattened, columns=[
+        '代码', '触发日期', '触发价', 'T+1开盘涨幅',
+        '最高冲击%', '持有10日收益%', 'MACD增速', '_stopped'])
+    res_df['状态'] = np.where(res_df.pop('_stopped'), '止损离场', '持有期满')
+    res_df = res_df.round({'T+1开盘涨幅': 2, '最高冲击%': 2,
+                           '持有10日收益%': 2, 'MACD增速': 2})
+    res_df['名称'] = res_df['代码'].map(names_dict).fillna("未知")
+    # 几千行结果里代码/名称大量重复，category 只存一份字符串
+    res_df['代码'] = res_df['代码'].astype('category')
+    res_df['名称'] = res_df['名称'].astype('category')
     
     # 统计核心数据
     total = len(res_df)
@@ -12,20 +12,28 @@ def analyze_stats(file_path):
     if df.empty: return
 
     # 定义“高质量信号”标准：10日内涨幅曾超过 10%
-    df['高质量'] = df['最高冲击%'] > 10
+    quality = (df['最高冲击%'].to_numpy(dtype=np.float64) > 10).astype(np.float64)
+    rets = df['持有10日收益%'].to_numpy(dtype=np.float64)
 
     print(f"📊 深度诊断报告: {os.path.basename(file_path)}")
     print("="*50)
 
     # --- 维度 1: T+1 追高风险分析 (验证你的避坑区) ---
+    # 只有四个固定分桶，np.digitize 直接给桶号做归约即可，
+    # 不必经过 pd.cut 的 Categorical 索引和 groupby 机制
+    # （桶边界语义与 pd.cut 相同：左开右闭）
     print("\n[1. 入场时点分布 - 寻找最安全买点]")
     bins_open = [-10, -1, 1.5, 5, 11]
     labels_open = ['低开回踩(< -1%)', '黄金开盘(-1%~1.5%)', '中度高开(1.5%~5%)', '追涨禁区(> 5%)']
-    df['买入区间'] = pd.cut(df['T+1开盘涨幅'], bins=bins_open, labels=labels_open)
-    open_stats = df.groupby('买入区间', observed=False).agg({
-        '持有10日收益%': 'mean',
-        '高质量': 'mean'
-    }).rename(columns={'持有10日收益%': '平均收益', '高质量': '10%爆发率'})
+    jumps = df['T+1开盘涨幅'].to_numpy(dtype=np.float64)
+    codes = np.digitize(jumps, bins_open[1:-1], right=True)
+    in_range = (jumps > bins_open[0]) & (jumps <= bins_open[-1])
+    rows = []
+    for k in range(len(labels_open)):
+        m = in_range & (codes == k)
+        rows.append((rets[m].mean(), quality[m].mean()) if m.any() else (np.nan, np.nan))
+    open_stats = pd.DataFrame(rows, index=pd.Index(labels_open, name='买入区间'),
+                              columns=['平均收益', '10%爆发率'])
     print(open_stats)
 
     # --- 维度 2: 成交额与胜率 (大盘股 vs 小盘股) ---
@@ -33,8 +41,18 @@ def analyze_stats(file_path):
     if '成交额' in df.columns:
         print("\n[2. 资金容量分析 - 哪种体量的票更容易飞?]")
         # 以 2亿 和 10亿 为界
-        df['资金体量'] = pd.cut(df['成交额'], bins=[0, 2e8, 10e8, 1e12], labels=['小微盘(<2亿)', '中盘主力(2-10亿)', '大盘权重(>10亿)'])
-        money_stats = df.groupby('资金体量', observed=False)['最高冲击%'].mean()
+        bins_amt = [0, 2e8, 10e8, 1e12]
+        labels_amt = ['小微盘(<2亿)', '中盘主力(2-10亿)', '大盘权重(>10亿)']
+        amounts = df['成交额'].to_numpy(dtype=np.float64)
+        peaks = df['最高冲击%'].to_numpy(dtype=np.float64)
+        codes_amt = np.digitize(amounts, bins_amt[1:-1], right=True)
+        in_range_amt = (amounts > bins_amt[0]) & (amounts <= bins_amt[-1])
+        vals = []
+        for k in range(len(labels_amt)):
+            m = in_range_amt & (codes_amt == k)
+            vals.append(peaks[m].mean() if m.any() else np.nan)
+        money_stats = pd.Series(vals, index=pd.Index(labels_amt, name='资金体量'),
+                                name='最高冲击%')
         print(money_stats)
 
     # --- 维度 3: 止盈回吐分析 ---
@@ -1,98 +1,248 @@
 import pandas as pd
 import numpy as np
 import os
+import csv
 import glob
 from datetime import datetime
 from multiprocessing import Pool, cpu_count
 
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+    # 没装 numba 时退化为纯 Python 执行，逻辑完全一致
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        def wrap(func):
+            return func
+        return wrap
+
 # --- 核心配置 ---
 DATA_DIR = "stock_data"
 NAME_MAP_FILE = 'stock_names.csv'
+CACHE_DIR = 'cache'
 
-def calculate_indicators(df):
-    """手写核心指标，确保逻辑与 V6 回测完全一致"""
-    close = df['Close']
-    high = df['High']
-    low = df['Low']
-    vol = df['Volume']
-
-    # 1. 均线系统 (V6 严苛排列)
-    df['MA5'] = close.rolling(5).mean()
-    df['MA10'] = close.rolling(10).mean()
-    df['MA20'] = close.rolling(20).mean()
-    df['MA5V'] = vol.rolling(5).mean()
-
-    # 2. RSI6
-    delta = close.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(6).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(6).mean()
-    df['RSI6'] = 100 - (100 / (1 + gain/loss))
-
-    # 3. KDJ
-    low_9 = low.rolling(9).min()
-    high_9 = high.rolling(9).max()
-    rsv = (close - low_9) / (high_9 - low_9) * 100
-    df['K'] = rsv.ewm(com=2).mean()
-    df['D'] = df['K'].ewm(com=2).mean()
-
-    # 4. MACD (动能加速)
-    exp1 = close.ewm(span=12, adjust=False).mean()
-    exp2 = close.ewm(span=26, adjust=False).mean()
-    df['DIF'] = exp1 - exp2
-    df['DEA'] = df['DIF'].ewm(span=9, adjust=False).mean()
-    df['MACD_HIST'] = (df['DIF'] - df['DEA']) * 2
-    
+# 狙击筛选只用到这六列；日期、振幅等其余列在解析阶段就不碰
+SN_COLS = ['开盘', '收盘', '最高', '最低', '成交量', '成交额']
+SN_RENAME = {'收盘': 'Close', '开盘': 'Open', '最高': 'High',
+             '最低': 'Low', '成交量': 'Volume', '成交额': 'Amount'}
+
+# 扫描只看最后一根K线，指标只需要一段尾部历史：
+# 最大取值窗口是突破判定的 41 根，其余都是 EWM 递推；
+# MACD(span=26, adjust=False) 在截断处换种子的残差按 (25/27)^n 衰减，
+# 240 根时约 1e-8，与全量历史算出的结果一致。
+TAIL_BARS = 240
+
+@njit(cache=True)
+def _tail_indicators(close, high, low, vol):
+    """单遍递推算出筛选要用的末两根标量。
+
+    各指标递推式与 pandas 的 rolling / ewm(adjust=True|False) 一一对应，
+    结果与整条 Series 版一致；区别只是不再为每个指标分配全长数组。
+    """
+    n = close.shape[0]
+
+    # 1. 均线系统 (V6 严苛排列)：只要最后一个窗口的均值
+    ma5 = close[n-5:].mean()
+    ma10 = close[n-10:].mean()
+    ma20 = close[n-20:].mean()
+    ma5v = vol[n-5:].mean()
+
+    # 2. RSI6：rolling(6).mean 的末值 = 最近 6 个涨跌幅的均值
+    gain = 0.0
+    loss = 0.0
+    for i in range(n - 6, n):
+        d = close[i] - close[i-1]
+        if d > 0:
+            gain += d
+        elif d < 0:
+            loss -= d
+    gain /= 6.0
+    loss /= 6.0
+    rsi6 = 100.0 if loss == 0.0 else 100.0 - 100.0 / (1.0 + gain / loss)
+
+    # 4. MACD (动能加速)：adjust=False，从首根收盘价起步
+    a12, a26, a9 = 2.0 / 13.0, 2.0 / 27.0, 2.0 / 10.0
+    e12 = close[0]
+    e26 = close[0]
+    dea = 0.0
+    hist_prev = 0.0
+    for i in range(1, n):
+        e12 = a12 * close[i] + (1.0 - a12) * e12
+        e26 = a26 * close[i] + (1.0 - a26) * e26
+        dif = e12 - e26
+        dea = a9 * dif + (1.0 - a9) * dea
+        if i == n - 2:
+            hist_prev = (dif - dea) * 2.0
+    dif = e12 - e26
+    hist = (dif - dea) * 2.0
+
+    # 3. KDJ：ewm(com=2) 是 adjust=True，用 加权和/权重和 两条递推；
+    # 9 日窗口平盘时 rsv 为 NaN，pandas 的处理是只衰减权重不进样本
+    alpha = 1.0 / 3.0
+    k_num, k_den = 0.0, 0.0
+    d_num, d_den = 0.0, 0.0
+    k = np.nan
+    d = np.nan
+    k_prev = np.nan
+    d_prev = np.nan
+    for i in range(8, n):
+        low_9 = low[i-8:i+1].min()
+        high_9 = high[i-8:i+1].max()
+        if high_9 != low_9:
+            rsv = (close[i] - low_9) / (high_9 - low_9) * 100.0
+            k_num = (1.0 - alpha) * k_num + rsv
+            k_den = (1.0 - alpha) * k_den + 1.0
+        else:
+            k_num *= (1.0 - alpha)
+            k_den *= (1.0 - alpha)
+        k = k_num / k_den if k_den > 0 else np.nan
+        if k == k:
+            d_num = (1.0 - alpha) * d_num + k
+            d_den = (1.0 - alpha) * d_den + 1.0
+        else:
+            d_num *= (1.0 - alpha)
+            d_den *= (1.0 - alpha)
+        d = d_num / d_den if d_den > 0 else np.nan
+        if i == n - 2:
+            k_prev = k
+            d_prev = d
+
+    return ma5, ma10, ma20, ma5v, rsi6, k, k_prev, d, d_prev, dif, dea, hist, hist_prev
+
+def calculate_indicators(close, high, low, vol):
+    """手写核心指标，确保逻辑与 V6 回测完全一致。
+
+    整段计算收进一个 numba 内核单遍跑完，只返回筛选要用的标量；
+    ~10 次 pandas rolling/ewm 调度和它们的全长中间 Series 都省掉了。
+    """
+    (ma5, ma10, ma20, ma5v, rsi6, k, k_prev, d, d_prev,
+     dif, dea, hist, hist_prev) = _tail_indicators(close, high, low, vol)
+    return {
+        'MA5': ma5, 'MA10': ma10, 'MA20': ma20, 'MA5V': ma5v,
+        'RSI6': rsi6, 'K': k, 'K_PREV': k_prev, 'D': d, 'D_PREV': d_prev,
+        'DIF': dif, 'DEA': dea, 'MACD_HIST': hist, 'MACD_HIST_PREV': hist_prev,
+    }
+
+def read_bars(file_path):
+    """只解析筛选用到的六列，类型直接给定免推断；装了 pyarrow 时走
+    mtime 失效的 parquet 缓存（需要成交额，列集和扫描器缓存不同，
+    单独留 .sn 后缀），缓存未命中才落到多线程 C 解析器。"""
+    if not HAS_PYARROW:
+        df = pd.read_csv(file_path, usecols=SN_COLS)
+        # 价格量能 float32 足够，省一半内存带宽
+        for c in SN_COLS:
+            df[c] = df[c].astype(np.float32)
+        return df
+
+    cache_path = os.path.join(
+        CACHE_DIR, os.path.basename(file_path).replace('.csv', '.sn.parquet'))
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+        return pd.read_parquet(cache_path)
+
+    convert = pa_csv.ConvertOptions(
+        column_types={c: pa.float32() for c in SN_COLS},
+        include_columns=SN_COLS)
+    df = pa_csv.read_csv(file_path, convert_options=convert).to_pandas()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    df.to_parquet(cache_path, index=False)
     return df
 
+_NAMES = {}
+
+def _init_worker(names_dict):
+    # 名称表通过 initializer 每个 worker 只传一次，不再跟着每个任务反复 pickle
+    global _NAMES
+    _NAMES = names_dict
+
 def process_file(file_path):
     """并行处理单只个股逻辑"""
     code = os.path.basename(file_path).split('.')[0]
+    # ST/退市票在打开文件前就拒掉，连 I/O 都省；名称就地带上，
+    # 被拒的行也不用再经过 pickle 运回主进程
+    name = _NAMES.get(code, "未知")
+    if "ST" in name or "退" in name: return None
     try:
-        df = pd.read_csv(file_path)
+        df = read_bars(file_path)
         if len(df) < 100: return None
-        df.columns = df.columns.str.strip()
-        df.rename(columns={'日期':'Date','收盘':'Close','开盘':'Open','最高':'High','最低':'Low','成交量':'Volume','成交额':'Amount'}, inplace=True)
-        
-        df = calculate_indicators(df)
-        curr = df.iloc[-1]
-        prev = df.iloc[-2]
+        df.rename(columns=SN_RENAME, inplace=True)
+
+        # 先截尾再算指标：rolling/ewm 不必在几千根历史上整条跑一遍
+        if len(df) > TAIL_BARS:
+            df = df.tail(TAIL_BARS).reset_index(drop=True)
+
+        # 每列只抽一次 numpy 数组，后面的切片/取末值都不再经过
+        # Series 构造和 block manager；列在解析时就是 float32，
+        # 指标递推也保持 float32——结果只取两位小数，精度绰绰有余
+        close_arr = df['Close'].to_numpy()
+        high_arr = df['High'].to_numpy()
+        low_arr = df['Low'].to_numpy()
+        vol_arr = df['Volume'].to_numpy()
+
+        last_close = close_arr[-1]
 
         # --- 共有基础条件 (突破与量能) ---
-        prev_high_40 = df['High'].iloc[-41:-1].max()
-        is_breakout = (curr['Close'] > prev_high_40 * 1.01) and (curr['Close'] > curr['Open'])
-        is_vol = (2.0 * curr['MA5V'] < curr['Volume'] < 4.5 * curr['MA5V'])
-        is_rsi_base = (60 < curr['RSI6'] < 85)
-        
+        # 便宜的闸门放在指标递推前面：绝大多数票过不了 40 日突破或量能区间，
+        # 在这里直接拒掉，整段指标计算都省了
+        prev_high_40 = high_arr[-41:-1].max()
+        is_breakout = (last_close > prev_high_40 * 1.01) and (last_close > df['Open'].iat[-1])
+        if not is_breakout: return None
+        ma5v = vol_arr[-5:].mean()
+        is_vol = (2.0 * ma5v < vol_arr[-1] < 4.5 * ma5v)
+        if not is_vol: return None
+
+        ind = calculate_indicators(close_arr, high_arr, low_arr, vol_arr)
+        is_rsi_base = (60 < ind['RSI6'] < 85)
+        if not is_rsi_base: return None
+
         # --- V6 正式信号硬性条件 ---
-        is_trend_v6 = (curr['MA5'] > curr['MA10'] > curr['MA20'])
+        is_trend_v6 = (ind['MA5'] > ind['MA10'] > ind['MA20'])
         # MACD 增速要求 1.1 倍
-        macd_growth = curr['MACD_HIST'] / prev['MACD_HIST'] if prev['MACD_HIST'] != 0 else 0
-        is_macd_v6 = (curr['DIF'] > curr['DEA']) and (macd_growth > 1.1)
-        is_kdj_v6 = (curr['K'] > curr['D']) and (prev['K'] <= prev['D'])
+        macd_growth = ind['MACD_HIST'] / ind['MACD_HIST_PREV'] if ind['MACD_HIST_PREV'] != 0 else 0
+        is_macd_v6 = (ind['DIF'] > ind['DEA']) and (macd_growth > 1.1)
+        is_kdj_v6 = (ind['K'] > ind['D']) and (ind['K_PREV'] <= ind['D_PREV'])
 
         # 结果基础数据
         data = {
-            "代码": code, 
-            "价格": round(curr['Close'], 2), 
-            "额(万)": int(curr['Amount']/10000),
-            "RSI6": round(curr['RSI6'], 1),
+            "代码": code,
+            "名称": name,
+            "价格": round(last_close, 2),
+            "额(万)": int(df['Amount'].iat[-1]/10000),
+            "RSI6": round(ind['RSI6'], 1),
             "MACD速": round(macd_growth, 2),
-            "上限": round(curr['Close'] * 1.045, 2)
+            "上限": round(last_close * 1.045, 2)
         }
 
-        # 逻辑判定分类
-        if is_breakout and is_vol and is_rsi_base:
-            if is_trend_v6 and is_macd_v6 and is_kdj_v6:
-                data["类型"] = "正式信号"
-                return data
-            elif curr['MA5'] > curr['MA20'] and curr['MACD_HIST'] > 0:
-                # 观察名单条件：放宽了均线三头排列和MACD增速限制
-                data["类型"] = "观察储备"
-                return data
+        # 逻辑判定分类（突破/量能/RSI 三道共有闸门在上面已经过了）
+        if is_trend_v6 and is_macd_v6 and is_kdj_v6:
+            data["类型"] = "正式信号"
+            return data
+        elif ind['MA5'] > ind['MA20'] and ind['MACD_HIST'] > 0:
+            # 观察名单条件：放宽了均线三头排列和MACD增速限制
+            data["类型"] = "观察储备"
+            return data
                 
     except:
         return None
 
+def _fmt_md(df, cols):
+    """手拼 markdown 表格：结果就几十行，不必为此走 tabulate 的整套
+    格式化机制（to_markdown 还要额外装 tabulate）。GitHub 渲染效果相同。"""
+    lines = ['| ' + ' | '.join(cols) + ' |',
+             '|' + '|'.join(['---'] * len(cols)) + '|']
+    for row in df[cols].itertuples(index=False, name=None):
+        lines.append('| ' + ' | '.join(str(v) for v in row) + ' |')
+    return '\n'.join(lines)
+
 def update_readme(official_df, observer_df):
     """将扫描结果格式化写入 README.md"""
     now_str = datetime.now().strftime('%Y-%m-%d %H:%M')
@@ -101,15 +251,14 @@ def update_readme(official_df, observer_df):
     
     content += "## 🚀 正式实战信号 (V6 严苛模式)\n"
     if not official_df.empty:
-        # 使用 to_markdown 需要安装 tabulate 库
-        content += official_df[['代码', '名称', '价格', '上限', '额(万)', 'MACD速']].to_markdown(index=False)
+        content += _fmt_md(official_df, ['代码', '名称', '价格', '上限', '额(万)', 'MACD速'])
         content += "\n\n⚠️ **实战提示**：次日集合竞价价格若超过 **[上限]** 则放弃入场。\n"
     else:
         content += "_今日无符合 V6 严苛条件的正式信号。_\n"
     
     content += "\n---\n\n## ⊙ 潜力观察名单 (趋势蓄势中)\n"
     if not observer_df.empty:
-        content += observer_df[['代码', '名称', '价格', '额(万)', 'RSI6']].to_markdown(index=False)
+        content += _fmt_md(observer_df, ['代码', '名称', '价格', '额(万)', 'RSI6'])
         content += "\n\n> 💡 **观察建议**：此类个股已具备初步突破形态，但动能尚未完全爆发。建议关注明日早盘量能及回踩 MA5 的机会。\n"
     else:
         content += "_当前市场暂无具备潜力的观察标的。_\n"
@@ -132,24 +281,21 @@ def main():
         return
         
     print(f"🔍 [V6 复合扫描] 正在分析 {len(files)} 只个股...")
-    with Pool(cpu_count()) as pool:
-        results = [r for r in pool.map(process_file, files) if r is not None]
-
-    # 3. 过滤及汇总结果
-    final_results = []
-    for item in results:
-        name = names_dict.get(item['代码'], "未知")
-        if any(x in name for x in ["ST", "退"]): continue
-        item['名称'] = name
-        final_results.append(item)
-
-    if not final_results:
+    # imap_unordered + 大 chunksize：任务按块分发，IPC 往返少一个量级；
+    # 结果顺序无所谓，后面反正要按成交额重排
+    chunksize = max(1, len(files) // (cpu_count() * 8))
+    with Pool(cpu_count(), initializer=_init_worker, initargs=(names_dict,)) as pool:
+        results = [r for r in pool.imap_unordered(process_file, files, chunksize=chunksize)
+                   if r is not None]
+
+    # 3. 汇总结果（ST/退过滤和名称匹配已在 worker 里完成）
+    if not results:
         print("❌ 全市场今日无符合条件的信号。")
         update_readme(pd.DataFrame(), pd.DataFrame())
         return
 
     # 4. 数据分类与排序
-    df_res = pd.DataFrame(final_results)
+    df_res = pd.DataFrame(results)
     official = df_res[df_res['类型'] == "正式信号"].sort_values(by='额(万)', ascending=False)
     observer = df_res[df_res['类型'] == "观察储备"].sort_values(by='额(万)', ascending=False).head(15)
     
@@ -157,9 +303,14 @@ def main():
     update_readme(official, observer)
     
     # 6. 保存归档 CSV (保留原有功能)
+    # 几十行的归档用 stdlib csv 直接写 dict 列表，不必再绕一次 DataFrame
     now = datetime.now()
     save_filename = f"Daily_Sniper_V6_{now.strftime('%Y%m%d')}.csv"
-    df_res.to_csv(save_filename, index=False, encoding='utf-8-sig')
+    fieldnames = ['代码', '名称', '价格', '额(万)', 'RSI6', 'MACD速', '上限', '类型']
+    with open(save_filename, 'w', encoding='utf-8-sig', newline='') as f:
+        w = csv.DictWriter(f, fieldnames=fieldnames)
+        w.writeheader()
+        w.writerows(sorted(results, key=lambda r: -r['额(万)']))
     
     # 7. 终端输出预览
     print(f"\n✅ 扫描完成! \n- 正式信号: {len(official)} 个\n- 观察名单: {len(observer)} 个")